@@ -0,0 +1,410 @@
+"""
+Shared analysis & visualization for the comparison outputs.
+Buckets mismatches by percentage, shows worst offenders, and plots charts.
+
+analysis.py runs this on comparison_output.json (raw) and
+analysis_normalized.py on comparison_output_normalized.json, where the
+diff_normalized and hyperliquid_normalized fields are used instead.  When
+the delta file from normalize_data.py is newer than that (or it is missing),
+those fields are merged onto comparison_output.json at load time.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import numpy as np
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# ─── Mismatch buckets ────────────────────────────────────────────────────────
+BUCKETS = [
+    ("OK (< 0.5%)",       0,    0.5),
+    ("0.5% – 1%",         0.5,  1),
+    ("1% – 5%",           1,    5),
+    ("5% – 10%",          5,    10),
+    ("10% – 25%",         10,   25),
+    ("25% – 50%",         25,   50),
+    ("50% – 100%",        50,   100),
+    ("100% – 250%",       100,  250),
+    ("250% – 500%",       250,  500),
+    ("> 500%",            500,  float("inf")),
+]
+BUCKET_LABELS = tuple(label for label, _, _ in BUCKETS)
+# Lower edge of every bucket plus +inf; searchsorted(..., side="right") - 1
+# maps a pct to the bucket with lo <= pct < hi
+BUCKET_EDGES = np.array([lo for _, lo, _ in BUCKETS] + [np.inf])
+
+BUCKET_COLORS = [
+    "#2ecc71",   # OK
+    "#f1c40f",   # 0.5-1
+    "#e67e22",   # 1-5
+    "#e74c3c",   # 5-10
+    "#c0392b",   # 10-25
+    "#8e44ad",   # 25-50
+    "#6c3483",   # 50-100
+    "#1a5276",   # 100-250
+    "#0b5345",   # 250-500
+    "#17202a",   # >500
+]
+
+# Below this many points the per-class ax.scatter is faster than Datashader,
+# whose first call pays for imports and numba compilation (several seconds).
+DATASHADER_MIN_POINTS = 50_000
+
+
+@dataclass
+class Points:
+    """Every address-day pair with both sources, stored column-wise.
+
+    flow_adjustment and matches_before are only filled in normalized mode.
+    """
+    addresses: np.ndarray                       # str
+    dates: np.ndarray                           # str
+    artemis: np.ndarray                         # float64
+    hyperliquid: np.ndarray                     # float64, normalized HL value in normalized mode
+    pcts: np.ndarray                            # float64
+    matches: np.ndarray                         # bool
+    flow_adjustment: np.ndarray | None = None   # float64
+    matches_before: np.ndarray | None = None    # bool, raw (pre-normalization) match
+
+    def __len__(self) -> int:
+        return len(self.pcts)
+
+
+def top_n_indices(values: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n largest values, in descending order.
+
+    Uses argpartition (O(N)) to find the cutoff, then orders only the
+    candidates.  Ties at the cutoff keep their original order, matching a
+    stable descending sort.
+    """
+    n = min(n, len(values))
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(values, -n)[-n:]
+    candidates = np.flatnonzero(values >= values[top].min())
+    order = np.argsort(-values[candidates], kind="stable")
+    return candidates[order][:n]
+
+
+def mismatch_stats_by_address(points: Points) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mismatch day count and mean mismatch pct per address.
+
+    Addresses are factorized to integer codes and reduced with np.bincount,
+    so the group-by runs in one C pass.  Returns (addresses, counts,
+    mean_pcts) for addresses with at least one mismatch, ordered by count
+    descending; ties keep the order of each address's first mismatch.
+    """
+    mismatch = ~points.matches
+    addrs, codes = np.unique(points.addresses[mismatch], return_inverse=True)
+    counts = np.bincount(codes, minlength=len(addrs))
+    sums = np.bincount(codes, weights=points.pcts[mismatch], minlength=len(addrs))
+    first_seen = np.full(len(addrs), len(codes))
+    np.minimum.at(first_seen, codes, np.arange(len(codes)))
+    order = np.lexsort((first_seen, -counts))
+    return addrs[order], counts[order], sums[order] / counts[order]
+
+
+def load_data(path: str) -> tuple[str | None, Iterator[dict]]:
+    """Return (generated_at, iterator over address blocks).
+
+    With ijson installed the address blocks are streamed one at a time, so
+    the full document is never held in memory.  ijson picks its fastest
+    available backend (yajl2_c when compiled).  Without it we fall back to
+    a full load (orjson when available).
+    """
+    if ijson is None:
+        with open(path, "rb") as f:
+            data = json_loads(f.read())
+        return data.get("generated_at"), iter(data["addresses"])
+
+    with open(path, "rb") as f:
+        generated_at = next(ijson.items(f, "generated_at"), None)
+    return generated_at, _iter_addresses(path)
+
+
+def _iter_addresses(path: str) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "addresses.item", use_float=True)
+
+
+def load_with_delta(base_path: str, delta_path: str) -> tuple[str | None, Iterator[dict]]:
+    """Like load_data, but rebuilds the normalized document from the raw
+    comparison at base_path plus the normalized fields in delta_path.
+
+    Exits if the delta was built from a different run of base_path (its
+    source_generated_at does not match), since days it lacks would
+    otherwise fall back to the raw diff and be reported as normalized.
+    """
+    with open(delta_path, "rb") as f:
+        delta = json_loads(f.read())
+    base_generated_at, addresses = load_data(base_path)
+    if "source_generated_at" not in delta:
+        print(f"⚠  {delta_path} does not record which {base_path} it was built from"
+              f" – rerun normalize_data.py to be sure they match\n")
+    elif delta["source_generated_at"] != base_generated_at:
+        raise SystemExit(
+            f"{delta_path} was built from {base_path} generated "
+            f"{delta['source_generated_at']}, but {base_path} is now from "
+            f"{base_generated_at}. Rerun normalize_data.py."
+        )
+    return delta.get("generated_at"), _merge_delta(addresses, delta["addresses"])
+
+
+def _merge_delta(addresses: Iterable[dict], by_address: dict) -> Iterator[dict]:
+    for addr_block in addresses:
+        by_date = by_address.get(addr_block["address"], {})
+        for day in addr_block["series"]:
+            day.update(by_date.get(day["date"], {}))
+        yield addr_block
+
+
+def _use_delta(input_file: str, delta_file: str) -> bool:
+    """True if delta_file exists and is newer than input_file (or input_file
+    is missing), i.e. the last normalize_data.py run did not write --full."""
+    if not os.path.exists(delta_file):
+        return False
+    if not os.path.exists(input_file):
+        return True
+    return os.path.getmtime(delta_file) > os.path.getmtime(input_file)
+
+
+def analyse(addresses: Iterable[dict], normalized: bool):
+    tag = " (NORMALIZED)" if normalized else ""
+
+    # ── Collect every data-point that has both sources ────────────────────
+    addr_l: list[str] = []
+    date_l: list[str] = []
+    art_l: list[float] = []
+    hl_l: list[float] = []
+    adj_l: list[float] = []
+    pcts_l: list[float] = []
+    match_l: list[bool] = []
+    match_before_l: list[bool] = []
+    missing_count = 0
+
+    for addr_block in addresses:
+        addr = addr_block["address"]
+        for day in addr_block["series"]:
+            if normalized:
+                diff = day.get("diff_normalized", day["diff"])
+                hl = day.get("hyperliquid_normalized", day["hyperliquid"])
+            else:
+                diff = day["diff"]
+                hl = day["hyperliquid"]
+
+            pct = diff["pct"]
+            match = diff["match"]
+
+            if pct is None:
+                missing_count += 1
+                continue
+
+            addr_l.append(addr)
+            date_l.append(day["date"])
+            art_l.append(day["artemis"]["value"])
+            hl_l.append(hl["value"])
+            pcts_l.append(pct)
+            match_l.append(match)
+            if normalized:
+                adj_l.append(hl.get("flow_adjustment", 0))
+                match_before_l.append(day["diff"]["match"] is True)
+
+    points = Points(
+        addresses=np.array(addr_l),
+        dates=np.array(date_l),
+        artemis=np.array(art_l, dtype=np.float64),
+        hyperliquid=np.array(hl_l, dtype=np.float64),
+        pcts=np.array(pcts_l, dtype=np.float64),
+        matches=np.array(match_l, dtype=bool),
+    )
+    if normalized:
+        points.flow_adjustment = np.array(adj_l, dtype=np.float64)
+        points.matches_before = np.array(match_before_l, dtype=bool)
+    total_compared = len(points)
+
+    # ── Bucket assignment (vectorized) ───────────────────────────────────
+    idx = np.searchsorted(BUCKET_EDGES, points.pcts, side="right") - 1
+    bucket_counts = np.bincount(idx, minlength=len(BUCKETS))  # indexed like BUCKETS
+
+    # ── Print bucket table ───────────────────────────────────────────────
+    print("=" * 65)
+    print(f"MISMATCH DISTRIBUTION{tag}")
+    print(f"  Total compared pairs : {total_compared:,}")
+    print(f"  Missing (one side)   : {missing_count:,}")
+    print("=" * 65)
+    print(f"{'Bucket':<20} {'Count':>8} {'%':>8}  Bar")
+    print("-" * 65)
+    for i, label in enumerate(BUCKET_LABELS):
+        c = int(bucket_counts[i])
+        pct_of_total = c / total_compared * 100 if total_compared else 0
+        bar = "█" * int(pct_of_total / 2)
+        print(f"{label:<20} {c:>8,} {pct_of_total:>7.1f}%  {bar}")
+    print("-" * 65)
+
+    # ── Improvement summary ──────────────────────────────────────────────
+    if normalized:
+        fixed = int(np.count_nonzero(points.matches & ~points.matches_before))
+        worsened = int(np.count_nonzero(~points.matches & points.matches_before))
+        print(f"\n  Pairs fixed by normalization  : {fixed:,}")
+        print(f"  Pairs worsened                : {worsened:,}")
+
+    # ── Worst single-day mismatches ──────────────────────────────────────
+    print(f"\nTOP 20 WORST SINGLE-DAY MISMATCHES{tag}")
+    if normalized:
+        print(f"{'Address':<14} {'Date':<12} {'Artemis':>14} {'HL Norm':>14} {'Adj':>12} {'Diff%':>8}")
+        print("-" * 78)
+    else:
+        print(f"{'Address':<14} {'Date':<12} {'Artemis':>14} {'Hyperliquid':>14} {'Diff%':>8}")
+        print("-" * 65)
+    for i in top_n_indices(points.pcts, 20):
+        adj_s = ""
+        if normalized:
+            adj = points.flow_adjustment[i]
+            adj_s = (f"{adj:+,.0f}" if adj != 0 else "0").rjust(12) + " "
+        print(
+            f"{points.addresses[i][:12]}… {points.dates[i]:<12} "
+            f"{points.artemis[i]:>14,.0f} {points.hyperliquid[i]:>14,.0f} "
+            f"{adj_s}{points.pcts[i]:>7.1f}%"
+        )
+
+    # ── Addresses with most mismatch days ────────────────────────────────
+    mm_addrs, mm_counts, mm_avg_pcts = mismatch_stats_by_address(points)
+    print(f"\nTOP 20 ADDRESSES BY MISMATCH DAY COUNT{tag}")
+    print(f"{'Address':<44} {'Mismatch days':>14} {'Avg pct%':>10}")
+    print("-" * 70)
+    for addr, cnt, avg_pct in zip(mm_addrs[:20], mm_counts[:20], mm_avg_pcts[:20]):
+        print(f"{addr:<44} {cnt:>14} {avg_pct:>9.1f}%")
+
+    return points, bucket_counts, (mm_addrs, mm_counts, mm_avg_pcts)
+
+
+def scatter_datashader(ax, x, y, matches, lo, hi) -> bool:
+    """Rasterize the OK/mismatch point cloud with Datashader and draw it as
+    one image, so render cost no longer grows with the number of points.
+    Returns False (nothing drawn) if datashader is not installed or the
+    value range is empty (lo == hi), which Datashader cannot bin."""
+    if not hi > lo:
+        return False
+    try:
+        import datashader as ds
+        import datashader.transfer_functions as tf
+        import pandas as pd
+    except ImportError:
+        return False
+
+    df = pd.DataFrame({
+        "x": x,
+        "y": y,
+        "cat": pd.Categorical(np.where(matches, "ok", "bad"), categories=["ok", "bad"]),
+    })
+    cvs = ds.Canvas(plot_width=1000, plot_height=750, x_range=(lo, hi), y_range=(lo, hi))
+    agg = cvs.points(df, "x", "y", ds.count_cat("cat"))
+    img = tf.shade(agg, color_key={"ok": "#2ecc71", "bad": "#e74c3c"}, min_alpha=100)
+    img = tf.spread(img, px=1)
+    ax.imshow(img.to_pil(), extent=[lo, hi, lo, hi], aspect="auto")
+    return True
+
+
+def visualize(points: Points, bucket_counts, addr_stats, normalized: bool):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import matplotlib.ticker as mticker
+    except ImportError:
+        print("\n⚠  matplotlib not installed – skipping charts. pip install matplotlib")
+        return
+
+    tag = " (Normalized)" if normalized else ""
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle(f"Artemis vs Hyperliquid{tag} — Perp Account Value Comparison", fontsize=14, y=0.98)
+
+    # ── 1. Bucket bar chart ──────────────────────────────────────────────
+    ax = axes[0, 0]
+    labels = list(BUCKET_LABELS)
+    counts = bucket_counts
+    bars = ax.barh(labels[::-1], counts[::-1], color=BUCKET_COLORS[::-1])
+    ax.set_xlabel("Number of address-day pairs")
+    ax.set_title(f"Distribution of Diff %{tag}")
+    for bar, c in zip(bars, counts[::-1]):
+        if c > 0:
+            ax.text(bar.get_width() + max(counts) * 0.01, bar.get_y() + bar.get_height() / 2,
+                    f"{c:,}", va="center", fontsize=9)
+
+    # ── 2. Histogram of pct diffs (log scale) ────────────────────────────
+    ax = axes[0, 1]
+    hist_counts, hist_edges = np.histogram(points.pcts, bins=100)
+    ax.bar(hist_edges[:-1], hist_counts, width=np.diff(hist_edges), align="edge",
+           color="#3498db", edgecolor="white", linewidth=0.3)
+    ax.set_xlabel("Diff %")
+    ax.set_ylabel("Count")
+    ax.set_title("Histogram of Diff % (Normalized)" if normalized else "Histogram of Diff % (all pairs)")
+    ax.set_yscale("log")
+    ax.axvline(0.5, color="green", linestyle="--", linewidth=1, label="0.5% threshold")
+    ax.legend()
+
+    # ── 3. Scatter: Artemis vs Hyperliquid values ────────────────────────
+    ax = axes[1, 0]
+    art_vals = points.artemis
+    hl_vals = points.hyperliquid
+    lo = min(art_vals.min(), hl_vals.min())
+    hi = max(art_vals.max(), hl_vals.max())
+    if len(points) < DATASHADER_MIN_POINTS or not scatter_datashader(
+            ax, hl_vals, art_vals, points.matches, lo, hi):
+        # One single-colour call per class avoids matplotlib's per-point
+        # colour path; rasterized keeps the markers out of vector output
+        ok = points.matches
+        for mask, color in ((ok, "#2ecc71"), (~ok, "#e74c3c")):
+            ax.scatter(hl_vals[mask], art_vals[mask], c=color, alpha=0.15, s=8,
+                       linewidths=0, rasterized=True)
+    # Perfect-match line
+    ax.plot([lo, hi], [lo, hi], "k--", linewidth=0.8, alpha=0.5)
+    if normalized:
+        ax.set_xlabel("Hyperliquid Normalized ($)")
+        ax.set_title("Artemis vs HL Normalized (green=OK, red=mismatch)")
+    else:
+        ax.set_xlabel("Hyperliquid value ($)")
+        ax.set_title("Artemis vs Hyperliquid (green=OK, red=mismatch)")
+    ax.set_ylabel("Artemis value ($)")
+    ax.xaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f"${x/1e6:.1f}M"))
+    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f"${x/1e6:.1f}M"))
+
+    # ── 4. Mismatch days per address (top 30) ────────────────────────────
+    ax = axes[1, 1]
+    mm_addrs, mm_counts, _ = addr_stats
+    addrs_short = [a[:8] + "…" for a in mm_addrs[:30]]
+    cnts = mm_counts[:30]
+    ax.barh(addrs_short[::-1], cnts[::-1], color="#e74c3c")
+    ax.set_xlabel("Mismatch days")
+    ax.set_title(f"Top 30 addresses by mismatch count{tag}")
+
+    plt.tight_layout(rect=[0, 0, 1, 0.96])
+    out = "analysis_charts_normalized.png" if normalized else "analysis_charts.png"
+    plt.savefig(out, dpi=150)
+    print(f"\n📊 Charts saved to {out}")
+    plt.close()
+
+
+def main(input_file: str, normalized: bool, base_file: str | None = None,
+         delta_file: str | None = None):
+    if base_file and delta_file and _use_delta(input_file, delta_file):
+        generated_at, addresses = load_with_delta(base_file, delta_file)
+        print(f"Loaded {base_file} + {delta_file}  (generated {generated_at})\n")
+    else:
+        generated_at, addresses = load_data(input_file)
+        print(f"Loaded {input_file}  (generated {generated_at})\n")
+
+    points, bucket_counts, addr_stats = analyse(addresses, normalized)
+    visualize(points, bucket_counts, addr_stats, normalized)
+    print("\nDone.")
@@ -11,14 +11,26 @@ from botocore.config import Config
 import json
 import os
 import csv
+import re
+import tempfile
+import threading
+import numpy as np
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Iterable
+
+from json_io import json_loads, read_json, write_json
 
 # ─── Artemis S3 constants (from old_script_artemis) ─────────────────────────
 BUCKET_NAME = "artemis-hyperliquid-data"
 PREFIX = "raw/perp_and_spot_balances/"
-TEMP_FILE = "temp_balance_file.jsonl"
+S3_WORKERS = 16  # concurrent snapshot downloads
+
+# Any 0x-prefixed 40-hex token; used to reject snapshot lines before parsing
+ADDRESS_RE = re.compile(rb"0x[0-9a-fA-F]{40}")
 
 # ─── Time window ─────────────────────────────────────────────────────────────
 DAYS = 32
@@ -27,6 +39,8 @@ START_DATE = END_DATE - timedelta(days=DAYS - 1)
 
 OUTPUT_FILE = "comparison_output.json"
 HL_API_URL = "https://api.hyperliquid.xyz/info"
+HL_WORKERS = 16  # concurrent portfolio requests
+HL_CACHE_DIR = ".hl_cache"  # raw portfolio responses, one file per address per UTC hour
 
 
 # =============================================================================
@@ -54,6 +68,7 @@ def get_s3_client():
         connect_timeout=30,
         read_timeout=300,
         retries={"max_attempts": 3},
+        max_pool_connections=32,
     )
     return boto3.client("s3", config=config)
 
@@ -78,123 +93,130 @@ def list_files_for_date(s3_client, date: datetime) -> list[str]:
         return []
 
 
-def download_file(s3_client, s3_key: str, local_path: str) -> bool:
+def stream_and_extract(s3_client, s3_key: str, wallet_set: set[str]) -> list[dict]:
+    """Stream one snapshot from S3 straight into the parser (no temp file).
+
+    Safe to run from several threads at once; each call owns its body stream.
+    """
     try:
-        head = s3_client.head_object(
+        obj = s3_client.get_object(
             Bucket=BUCKET_NAME,
             Key=s3_key,
             RequestPayer="requester",
         )
-        file_size = head["ContentLength"]
-        file_size_mb = file_size / (1024 * 1024)
+        file_size_mb = obj["ContentLength"] / (1024 * 1024)
         file_name = os.path.basename(s3_key)
-        print(f"{file_name} ({file_size_mb:.1f} MB) … ", end="", flush=True)
 
-        s3_client.download_file(
-            BUCKET_NAME,
-            s3_key,
-            local_path,
-            ExtraArgs={"RequestPayer": "requester"},
-        )
-        print("✓ ", end="", flush=True)
-        return True
+        records = extract_wallet_data(obj["Body"].iter_lines(chunk_size=1 << 20), wallet_set)
+        print(f"{file_name} ({file_size_mb:.1f} MB) ✓ ", end="", flush=True)
+        return records
     except Exception as e:
         print(f"\n  S3 download error {s3_key}: {e}")
-        return False
+        return []
 
 
-def extract_wallet_data(file_path: str, wallet_set: set[str]) -> list[dict]:
-    """Parse a .jsonl snapshot and return records for addresses in wallet_set.
+def extract_wallet_data(lines: Iterable[bytes], wallet_set: set[str]) -> list[dict]:
+    """Parse .jsonl snapshot lines and return records for addresses in wallet_set.
 
     Each record: {"address", "timestamp_ms", "account_value"}
+
+    Snapshots hold every wallet on Hyperliquid while wallet_set is small, so
+    lines that contain none of our addresses are dropped before the (much
+    more expensive) JSON parse.
     """
     results: list[dict] = []
-    with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                data = json.loads(line.strip())
-                if data.get("_metadata", False):
-                    continue
-                address = data.get("address", "").lower()
-                if address not in wallet_set:
-                    continue
-
-                response = data.get("response", {})
-                perpetual = response.get("perpetual", {})
-                margin_summary = perpetual.get("marginSummary", {})
-                account_value = float(margin_summary.get("accountValue", 0))
-
-                # Timestamp handling: raw field may be ISO string or epoch-ms
-                raw_ts = data.get("timestamp", "")
-                if isinstance(raw_ts, (int, float)):
-                    ts_ms = int(raw_ts)
-                else:
-                    try:
-                        dt = datetime.fromisoformat(str(raw_ts).replace("Z", "+00:00"))
-                        ts_ms = int(dt.timestamp() * 1000)
-                    except Exception:
-                        ts_ms = 0
-
-                results.append(
-                    {
-                        "address": address,
-                        "timestamp_ms": ts_ms,
-                        "account_value": account_value,
-                    }
-                )
-            except (json.JSONDecodeError, Exception):
+    wallet_bytes = {a.encode() for a in wallet_set}
+    for line in lines:
+        if not any(m.lower() in wallet_bytes for m in ADDRESS_RE.findall(line)):
+            continue
+        try:
+            data = json_loads(line)
+            if data.get("_metadata", False):
+                continue
+            address = data.get("address", "").lower()
+            if address not in wallet_set:
                 continue
+
+            response = data.get("response", {})
+            perpetual = response.get("perpetual", {})
+            margin_summary = perpetual.get("marginSummary", {})
+            account_value = float(margin_summary.get("accountValue", 0))
+
+            # Timestamp handling: raw field may be ISO string or epoch-ms
+            raw_ts = data.get("timestamp", "")
+            if isinstance(raw_ts, (int, float)):
+                ts_ms = int(raw_ts)
+            else:
+                try:
+                    dt = datetime.fromisoformat(str(raw_ts).replace("Z", "+00:00"))
+                    ts_ms = int(dt.timestamp() * 1000)
+                except Exception:
+                    ts_ms = 0
+
+            results.append(
+                {
+                    "address": address,
+                    "timestamp_ms": ts_ms,
+                    "account_value": account_value,
+                }
+            )
+        except (json.JSONDecodeError, Exception):
+            continue
     return results
 
 
 def fetch_artemis_data(
     addresses: list[str],
-) -> dict[str, dict[str, list[dict]]]:
+) -> dict[str, dict[str, dict]]:
     """Download Artemis S3 snapshots for [START_DATE, END_DATE] and return
-    nested dict: address → date_str → [records].
+    nested dict: address → date_str → latest record of that day.
     """
     wallet_set = set(addresses)
     s3_client = get_s3_client()
 
-    # address -> date_str -> list of {timestamp_ms, account_value}
-    data: dict[str, dict[str, list[dict]]] = defaultdict(lambda: defaultdict(list))
+    # address -> date_str -> {timestamp_ms, account_value} with the largest timestamp
+    data: dict[str, dict[str, dict]] = {}
 
     current = START_DATE
     total_days = (END_DATE - START_DATE).days + 1
     day_num = 0
 
-    while current <= END_DATE:
-        day_num += 1
-        date_str = current.strftime("%Y-%m-%d")
-        print(f"  [Artemis {day_num}/{total_days}] {date_str} … ", end="", flush=True)
+    with ThreadPoolExecutor(max_workers=S3_WORKERS) as executor:
+        while current <= END_DATE:
+            day_num += 1
+            date_str = current.strftime("%Y-%m-%d")
+            print(f"  [Artemis {day_num}/{total_days}] {date_str} … ", end="", flush=True)
 
-        files = list_files_for_date(s3_client, current)
-        if not files:
-            print("no files")
-            current += timedelta(days=1)
-            continue
-
-        day_records: list[dict] = []
-        print(f"{len(files)} file(s): ", end="", flush=True)
-
-        # Download ALL files for the day so we can pick the latest per address
-        for s3_key in files:
-            if download_file(s3_client, s3_key, TEMP_FILE):
-                recs = extract_wallet_data(TEMP_FILE, wallet_set)
-                day_records.extend(recs)
-                if os.path.exists(TEMP_FILE):
-                    os.remove(TEMP_FILE)
+            files = list_files_for_date(s3_client, current)
+            if not files:
+                print("no files")
+                current += timedelta(days=1)
+                continue
 
-        for rec in day_records:
-            data[rec["address"]][date_str].append(
-                {
-                    "timestamp_ms": rec["timestamp_ms"],
-                    "account_value": rec["account_value"],
-                }
-            )
+            day_records: list[dict] = []
+            print(f"{len(files)} file(s): ", end="", flush=True)
+
+            # Download ALL files for the day so we can pick the latest per address
+            futures = [
+                executor.submit(stream_and_extract, s3_client, s3_key, wallet_set)
+                for s3_key in files
+            ]
+            # Collect in file order (not completion order) so ties on
+            # timestamp_ms keep the record from the earliest file, every run
+            for future in futures:
+                day_records.extend(future.result())
+
+            for rec in day_records:
+                by_date = data.setdefault(rec["address"], {})
+                prev = by_date.get(date_str)
+                if prev is None or rec["timestamp_ms"] > prev["timestamp_ms"]:
+                    by_date[date_str] = {
+                        "timestamp_ms": rec["timestamp_ms"],
+                        "account_value": rec["account_value"],
+                    }
 
-        print(f"→ {len(day_records)} records")
-        current += timedelta(days=1)
+            print(f"→ {len(day_records)} records")
+            current += timedelta(days=1)
 
     return data
 
@@ -203,63 +225,137 @@ def fetch_artemis_data(
 # SOURCE B — HYPERLIQUID API
 # =============================================================================
 
+_thread_local = threading.local()
+
+
+def get_http_session() -> requests.Session:
+    """Keep-alive session for the calling thread (one per worker)."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
+
+
+def _cache_hour() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d_%H")
+
+
+def prune_hl_cache() -> int:
+    """Delete HL_CACHE_DIR entries from earlier hours (and leftover temp
+    files), so the cache holds at most one file per address.  Returns the
+    number of files removed."""
+    if not os.path.isdir(HL_CACHE_DIR):
+        return 0
+    keep_suffix = f"_{_cache_hour()}.json"
+    removed = 0
+    for name in os.listdir(HL_CACHE_DIR):
+        if name.endswith(keep_suffix):
+            continue
+        try:
+            os.remove(os.path.join(HL_CACHE_DIR, name))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def fetch_portfolio(addr: str) -> list:
+    """Raw portfolio response for one address.
+
+    Responses are cached on disk under HL_CACHE_DIR keyed by address and
+    UTC hour, so reruns within the same hour skip the network entirely.
+    """
+    hour = _cache_hour()
+    cache_path = os.path.join(HL_CACHE_DIR, f"{addr}_{hour}.json")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                return json_loads(f.read())
+        except ValueError:
+            pass  # truncated/corrupt entry; refetch below
+
+    resp = get_http_session().post(
+        HL_API_URL,
+        json={"type": "portfolio", "user": addr},
+        timeout=30,
+    )
+    resp.raise_for_status()
+    payload = json_loads(resp.content)
+
+    # The cache is only an optimisation: a failed write must not drop the payload.
+    tmp_path = None
+    try:
+        os.makedirs(HL_CACHE_DIR, exist_ok=True)
+        # Unique temp name: duplicate addresses may be fetched by two workers at once.
+        fd, tmp_path = tempfile.mkstemp(dir=HL_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(resp.content)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return payload
+
+
 def fetch_hyperliquid_data(
     addresses: list[str],
 ) -> dict[str, dict[str, list[dict]]]:
     """Call the Hyperliquid portfolio endpoint for each address.
 
+    Requests run HL_WORKERS at a time; results are consumed in address order.
+
     Returns: address → date_str → [{ timestamp_ms, account_value }]
     """
     data: dict[str, dict[str, list[dict]]] = defaultdict(lambda: defaultdict(list))
 
-    for idx, addr in enumerate(addresses, 1):
-        print(f"  [HL API {idx}/{len(addresses)}] {addr[:10]}… ", end="", flush=True)
-        try:
-            resp = requests.post(
-                HL_API_URL,
-                json={"type": "portfolio", "user": addr},
-                timeout=30,
-            )
-            resp.raise_for_status()
-            payload = resp.json()
-        except Exception as e:
-            print(f"error: {e}")
-            continue
+    pruned = prune_hl_cache()
+    if pruned:
+        print(f"  Pruned {pruned} expired entries from {HL_CACHE_DIR}/")
 
-        # Response is a list of [key, data] pairs, e.g. ["perpMonth", {"accountValueHistory": [...], ...}]
-        try:
-            history = []
-            for entry in payload:
-                if isinstance(entry, list) and len(entry) == 2 and entry[0] == "perpMonth":
-                    history = entry[1].get("accountValueHistory", [])
-                    break
-            if not history:
-                print("no perpMonth data")
+    with ThreadPoolExecutor(max_workers=HL_WORKERS) as executor:
+        futures = [executor.submit(fetch_portfolio, addr) for addr in addresses]
+        for idx, (addr, future) in enumerate(zip(addresses, futures), 1):
+            print(f"  [HL API {idx}/{len(addresses)}] {addr[:10]}… ", end="", flush=True)
+            try:
+                payload = future.result()
+            except Exception as e:
+                print(f"error: {e}")
                 continue
-        except Exception:
-            print("unexpected shape")
-            continue
 
-        kept = 0
-        for point in history:
-            # Each point: [timestamp_ms, account_value_str]
-            ts_ms = int(point[0])
-            value = float(point[1])
-            dt = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
-
-            # Filter to our date window (include 1 day before START for
-            # the day-shift alignment with Artemis)
-            hl_start = (START_DATE - timedelta(days=1)).date()
-            if dt.date() < hl_start or dt.date() > END_DATE.date():
+            # Response is a list of [key, data] pairs, e.g. ["perpMonth", {"accountValueHistory": [...], ...}]
+            try:
+                history = []
+                for entry in payload:
+                    if isinstance(entry, list) and len(entry) == 2 and entry[0] == "perpMonth":
+                        history = entry[1].get("accountValueHistory", [])
+                        break
+                if not history:
+                    print("no perpMonth data")
+                    continue
+            except Exception:
+                print("unexpected shape")
                 continue
 
-            date_str = dt.strftime("%Y-%m-%d")
-            data[addr.lower()][date_str].append(
-                {"timestamp_ms": ts_ms, "account_value": value}
-            )
-            kept += 1
+            kept = 0
+            for point in history:
+                # Each point: [timestamp_ms, account_value_str]
+                ts_ms = int(point[0])
+                value = float(point[1])
+                dt = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+
+                # Filter to our date window (include 1 day before START for
+                # the day-shift alignment with Artemis)
+                hl_start = (START_DATE - timedelta(days=1)).date()
+                if dt.date() < hl_start or dt.date() > END_DATE.date():
+                    continue
 
-        print(f"{kept} points")
+                date_str = dt.strftime("%Y-%m-%d")
+                data[addr.lower()][date_str].append(
+                    {"timestamp_ms": ts_ms, "account_value": value}
+                )
+                kept += 1
+
+            print(f"{kept} points")
 
     return data
 
@@ -268,21 +364,28 @@ def fetch_hyperliquid_data(
 # COMPARISON
 # =============================================================================
 
-def pick_latest(records: list[dict]) -> dict | None:
-    """From a list of {timestamp_ms, account_value} return the one with the
-    largest timestamp (end-of-day proxy)."""
-    if not records:
-        return None
-    return max(records, key=lambda r: r["timestamp_ms"])
+def latest_per_day(
+    data: dict[str, dict[str, list[dict]]],
+) -> dict[str, dict[str, dict]]:
+    """Reduce address → date_str → [records] to the record with the largest
+    timestamp per (address, date) (end-of-day proxy)."""
+    by_ts = itemgetter("timestamp_ms")
+    return {
+        addr: {d: max(recs, key=by_ts) for d, recs in days.items() if recs}
+        for addr, days in data.items()
+    }
 
 
 def build_comparison(
     addresses: list[str],
-    artemis: dict[str, dict[str, list[dict]]],
+    artemis: dict[str, dict[str, dict]],
     hyperliquid: dict[str, dict[str, list[dict]]],
 ) -> dict:
     """Build the final JSON structure.
 
+    artemis already holds the latest record per (address, date); the
+    hyperliquid records are reduced to theirs here.
+
     Alignment: Artemis snapshots at ~01:17 UTC (start of day) while
     Hyperliquid's last point is ~22:46 UTC (end of day).  So Artemis's
     value for date D is closest to Hyperliquid's value for date D-1.
@@ -290,49 +393,67 @@ def build_comparison(
     for that date and the HL value from the previous calendar day.
     """
 
-    # Generate list of date strings in window (plus one day before for HL look-back)
+    # Date strings in window, each paired with the previous day's string
+    # for the HL look-back (computed once here, not per address)
     dates: list[str] = []
+    prev_dates: list[str] = []
+    prev_str = (START_DATE - timedelta(days=1)).strftime("%Y-%m-%d")
     cur = START_DATE
     while cur <= END_DATE:
-        dates.append(cur.strftime("%Y-%m-%d"))
+        date_str = cur.strftime("%Y-%m-%d")
+        dates.append(date_str)
+        prev_dates.append(prev_str)
+        prev_str = date_str
         cur += timedelta(days=1)
 
-    address_results = []
+    hl_latest_all = latest_per_day(hyperliquid)
 
+    # ── Pass 1: pick each pair's records, values into (address, date) grids
+    art_recs: list[list[dict | None]] = []
+    hl_recs: list[list[dict | None]] = []
     for addr in addresses:
-        addr_lower = addr.lower()
-        series = []
-        for date_str in dates:
-            art_latest = pick_latest(artemis.get(addr_lower, {}).get(date_str, []))
-
-            # HL: use the PREVIOUS day's latest value (closest in time to
-            # Artemis ~01:17 UTC on this date)
-            prev_date_str = (
-                datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=1)
-            ).strftime("%Y-%m-%d")
-            hl_latest = pick_latest(
-                hyperliquid.get(addr_lower, {}).get(prev_date_str, [])
-            )
-
-            art_value = art_latest["account_value"] if art_latest else None
-            hl_value = hl_latest["account_value"] if hl_latest else None
+        art_days = artemis.get(addr.lower(), {})
+        hl_days = hl_latest_all.get(addr.lower(), {})
+        art_recs.append([art_days.get(d) for d in dates])
+        # HL: use the PREVIOUS day's latest value (closest in time to
+        # Artemis ~01:17 UTC on this date)
+        hl_recs.append([hl_days.get(d) for d in prev_dates])
+
+    nan = float("nan")
+    art_vals = np.array(
+        [[r["account_value"] if r else nan for r in row] for row in art_recs],
+        dtype=np.float64,
+    ).reshape(len(addresses), len(dates))
+    hl_vals = np.array(
+        [[r["account_value"] if r else nan for r in row] for row in hl_recs],
+        dtype=np.float64,
+    ).reshape(len(addresses), len(dates))
+
+    # ── Vectorized diff; only meaningful where both values are present
+    with np.errstate(invalid="ignore", divide="ignore"):
+        abs_diff = np.abs(art_vals - hl_vals)
+        denom = np.maximum(np.abs(art_vals), np.abs(hl_vals))
+        pct = np.where(denom != 0, abs_diff / denom * 100.0, 0.0)
+    match = pct < 0.5
+    both_l = (~np.isnan(art_vals) & ~np.isnan(hl_vals)).tolist()
+    abs_l = abs_diff.tolist()
+    pct_l = np.round(pct, 4).tolist()
+    match_l = match.tolist()
+
+    # ── Pass 2: emit the JSON structure
+    address_results = []
 
-            # Compute diff only when both values are present
-            if art_value is not None and hl_value is not None:
-                abs_diff = abs(art_value - hl_value)
-                denom = max(abs(art_value), abs(hl_value))
-                pct_diff = (abs_diff / denom * 100) if denom != 0 else 0.0
-                match = pct_diff < 0.5
-            else:
-                abs_diff = None
-                pct_diff = None
-                match = None
+    for i, addr in enumerate(addresses):
+        series = []
+        for j, (date_str, prev_date_str) in enumerate(zip(dates, prev_dates)):
+            art_latest = art_recs[i][j]
+            hl_latest = hl_recs[i][j]
 
             entry: dict = {"date": date_str}
 
             entry["artemis"] = (
                 {
-                    "value": art_value,
+                    "value": art_latest["account_value"],
                     "last_timestamp": art_latest["timestamp_ms"],
                 }
                 if art_latest
@@ -341,7 +462,7 @@ def build_comparison(
 
             entry["hyperliquid"] = (
                 {
-                    "value": hl_value,
+                    "value": hl_latest["account_value"],
                     "last_timestamp": hl_latest["timestamp_ms"],
                     "source_date": prev_date_str,
                 }
@@ -349,15 +470,15 @@ def build_comparison(
                 else {"value": None, "last_timestamp": None, "source_date": prev_date_str}
             )
 
-            entry["diff"] = {
-                "abs": abs_diff,
-                "pct": round(pct_diff, 4) if pct_diff is not None else None,
-                "match": match,
-            }
+            entry["diff"] = (
+                {"abs": abs_l[i][j], "pct": pct_l[i][j], "match": match_l[i][j]}
+                if both_l[i][j]
+                else {"abs": None, "pct": None, "match": None}
+            )
 
             series.append(entry)
 
-        address_results.append({"address": addr_lower, "series": series})
+        address_results.append({"address": addr.lower(), "series": series})
 
     return {
         "generated_at": datetime.now(timezone.utc).isoformat(),
@@ -370,24 +491,23 @@ def build_comparison(
 # MAIN
 # =============================================================================
 
-def load_artemis_from_output(output_path: str) -> dict[str, dict[str, list[dict]]]:
+def load_artemis_from_output(output_path: str) -> dict[str, dict[str, dict]]:
     """Reload Artemis data from an existing comparison_output.json so we
-    don't need to re-download from S3."""
-    with open(output_path, "r") as f:
-        existing = json.load(f)
+    don't need to re-download from S3.  Same shape as fetch_artemis_data:
+    address → date_str → latest record."""
+    existing = read_json(output_path)
 
-    data: dict[str, dict[str, list[dict]]] = defaultdict(lambda: defaultdict(list))
+    data: dict[str, dict[str, dict]] = {}
     for addr_block in existing.get("addresses", []):
-        addr = addr_block["address"].lower()
+        by_date = data.setdefault(addr_block["address"].lower(), {})
         for day in addr_block.get("series", []):
-            art = day.get("artemis", {})
-            if art.get("value") is not None and art.get("last_timestamp") is not None:
-                data[addr][day["date"]].append(
-                    {
-                        "timestamp_ms": art["last_timestamp"],
-                        "account_value": art["value"],
-                    }
-                )
+            art = day.get("artemis") or {}
+            value, ts = art.get("value"), art.get("last_timestamp")
+            if value is None or ts is None:
+                continue
+            prev = by_date.get(day["date"])
+            if prev is None or ts > prev["timestamp_ms"]:
+                by_date[day["date"]] = {"timestamp_ms": ts, "account_value": value}
     return data
 
 
@@ -405,7 +525,7 @@ def main():
     if os.path.exists(OUTPUT_FILE):
         print("─── Source A: Loading Artemis from existing output ───")
         artemis_data = load_artemis_from_output(OUTPUT_FILE)
-        cached_addrs = len([a for a in artemis_data if artemis_data[a]])
+        cached_addrs = sum(1 for v in artemis_data.values() if v)
         print(f"  Loaded cached Artemis data for {cached_addrs} addresses\n")
     else:
         print("─── Source A: Artemis S3 (no cached output found) ───")
@@ -420,27 +540,15 @@ def main():
     result = build_comparison(addresses, artemis_data, hl_data)
 
     # 5. Write JSON
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(result, f, indent=2)
+    write_json(OUTPUT_FILE, result, serialize_numpy=True)
     print(f"\n✅  Written to {OUTPUT_FILE}")
 
-    # Quick summary
-    total_ok = 0
-    total_mismatch = 0
-    total_missing = 0
-    for a in result["addresses"]:
-        for s in a["series"]:
-            m = s["diff"]["match"]
-            if m is True:
-                total_ok += 1
-            elif m is False:
-                total_mismatch += 1
-            else:
-                total_missing += 1
+    # Quick summary (match is True / False / None)
+    matches = Counter(s["diff"]["match"] for a in result["addresses"] for s in a["series"])
 
-    print(f"    OK (< 0.5%): {total_ok}")
-    print(f"    Mismatch   : {total_mismatch}")
-    print(f"    Missing    : {total_missing}")
+    print(f"    OK (< 0.5%): {matches[True]}")
+    print(f"    Mismatch   : {matches[False]}")
+    print(f"    Missing    : {matches[None]}")
     print("Done.")
 
 
@@ -0,0 +1,65 @@
+"""
+JSON file I/O shared by extraction_data.py and normalize_data.py.
+Uses orjson when installed and falls back to the stdlib json module.
+"""
+
+import json
+import mmap
+import os
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+
+def read_json(path: str):
+    """Parse a JSON file.  With orjson the file is parsed straight from a
+    read-only mmap, so it is never copied into a separate bytes object."""
+    with open(path, "rb") as f:
+        if orjson is None or os.fstat(f.fileno()).st_size == 0:
+            return json_loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+
+def write_json(path: str, obj: dict, indent: bool = True, serialize_numpy: bool = False) -> None:
+    """Write obj as JSON, 2-space indented unless indent=False (orjson when available).
+
+    With orjson each top-level value, and each entry of a top-level list or
+    dict (the address blocks), is encoded and written on its own, so the
+    document is never held in memory as one bytes object.  The bytes match
+    a single orjson.dumps of obj.  serialize_numpy lets orjson encode NumPy
+    scalars and arrays natively.
+    """
+    if orjson is None:
+        with open(path, "w") as f:
+            json.dump(obj, f, indent=2 if indent else None)  # encodes incrementally
+        return
+    option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SERIALIZE_NUMPY if serialize_numpy else 0)
+    nl, pad, colon = (b"\n", b"  ", b": ") if indent else (b"", b"", b":")
+
+    def dumps(value, depth: int) -> bytes:
+        # Shift every line after the first to sit `depth` levels deep
+        out = orjson.dumps(value, option=option)
+        return out.replace(b"\n", b"\n" + pad * depth) if indent else out
+
+    with open(path, "wb") as f:
+        f.write(b"{")
+        for i, (key, value) in enumerate(obj.items()):
+            f.write((b"," if i else b"") + nl + pad + orjson.dumps(key) + colon)
+            if not isinstance(value, (list, dict)) or not value:
+                f.write(dumps(value, 1))
+                continue
+            is_dict = isinstance(value, dict)
+            f.write(b"{" if is_dict else b"[")
+            entries = value.items() if is_dict else ((None, item) for item in value)
+            for j, (k, item) in enumerate(entries):
+                f.write((b"," if j else b"") + nl + pad * 2)
+                if is_dict:
+                    f.write(orjson.dumps(k) + colon)
+                f.write(dumps(item, 2))
+            f.write(nl + pad + (b"}" if is_dict else b"]"))
+        f.write((nl if obj else b"") + b"}")
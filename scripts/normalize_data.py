@@ -3,27 +3,63 @@ Normalize Hyperliquid values by accounting for deposits, withdrawals,
 and perp↔spot transfers that occurred between the HL and Artemis snapshots.
 
 Reads comparison_output.json, fetches ledger events from the HL API,
-adjusts HL values, and writes comparison_output_normalized.json.
+adjusts HL values, and writes only the per-day normalized fields to
+comparison_output_normalization.json.  Pass --full to also write the
+merged comparison_output_normalized.json.
 """
 
+import argparse
 import json
+import math
+import os
+import threading
 import time
+import numpy as np
 import requests
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from json_io import orjson, read_json, write_json
 
 INPUT_FILE = "comparison_output.json"
 OUTPUT_FILE = "comparison_output_normalized.json"
+DELTA_FILE = "comparison_output_normalization.json"
 HL_API_URL = "https://api.hyperliquid.xyz/info"
+ZERO_HASH = "0x" + "0" * 64  # placeholder hash on some system-generated events
+HL_WORKERS = int(os.environ.get("HL_WORKERS", 16))  # concurrent ledger fetches
+# Retry rate limits and transient server errors with exponential backoff.
+# The ledger query is a read, so POSTs are safe to resend.
+HL_RETRY = Retry(
+    total=5,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset({"POST"}),
+)
 
 
 # =============================================================================
 # HL LEDGER API
 # =============================================================================
 
+_thread_local = threading.local()
+
+
+def get_http_session() -> requests.Session:
+    """Keep-alive session for the calling thread (one per worker), with
+    HL_RETRY applied to every request."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+        session.mount("https://", HTTPAdapter(max_retries=HL_RETRY))
+    return session
+
+
 def get_ledger_page(address: str, start_time_ms: int, end_time_ms: int) -> list:
     """Single page of userNonFundingLedgerUpdates."""
-    resp = requests.post(
+    resp = get_http_session().post(
         HL_API_URL,
         json={
             "type": "userNonFundingLedgerUpdates",
@@ -50,21 +86,90 @@ def get_all_ledger_events(address: str, start_ms: int, end_ms: int) -> list:
         all_events.extend(events)
         if len(events) < 2000:
             break
-        times = [ev.get("time") for ev in events if "time" in ev]
-        if times:
-            cursor = max(times)
-        else:
+        cursor = max((ev["time"] for ev in events if "time" in ev), default=None)
+        if cursor is None:
             break
 
-    # Deduplicate
-    unique = list(
-        {json.dumps(ev, sort_keys=True): ev for ev in all_events}.values()
-    )
+    # Deduplicate (pages overlap on the boundary millisecond)
+    seen: set = set()
+    unique: list = []
+    for ev in all_events:
+        key = _event_key(ev)
+        if key not in seen:
+            seen.add(key)
+            unique.append(ev)
     return unique
 
 
-def extract_flows(events: list) -> list[tuple[int, float]]:
-    """Parse ledger events into (timestamp_ms, signed_amount) tuples.
+def _event_key(ev: dict):
+    """Identity of a ledger event: (time, tx hash, delta type), or the whole
+    event serialized with sorted keys when it carries no usable hash."""
+    tx_hash = ev.get("hash")
+    if tx_hash and tx_hash != ZERO_HASH:
+        return ev.get("time"), tx_hash, ev.get("delta", {}).get("type")
+    if orjson is not None:
+        return orjson.dumps(ev, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(ev, sort_keys=True)
+
+
+def _flow_deposit(delta: dict) -> float | None:
+    try:
+        return float(delta["usdc"])
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def _flow_withdraw(delta: dict) -> float | None:
+    try:
+        return -float(delta["usdc"])
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def _flow_rewards_claim(delta: dict) -> float | None:
+    try:
+        return float(delta.get("amount", 0))
+    except (ValueError, TypeError):
+        return None
+
+
+def _flow_send(delta: dict) -> float | None:
+    try:
+        amt = float(delta.get("usdcValue", delta.get("amount", 0)))
+    except (ValueError, TypeError):
+        return None
+    src = delta.get("sourceDex", "")
+    dst = delta.get("destinationDex", "")
+    if src == "" and dst == "spot":
+        # perp → spot  (money leaving perp)
+        return -amt
+    if src == "spot" and dst == "":
+        # spot → perp  (money entering perp)
+        return amt
+    return None
+
+
+def _flow_account_class_transfer(delta: dict) -> float | None:
+    try:
+        amt = float(delta.get("usdc", 0))
+    except (ValueError, TypeError):
+        return None
+    return amt if delta.get("toPerp", False) else -amt
+
+
+# Ledger delta type → handler returning the signed amount, or None to skip
+FLOW_HANDLERS = {
+    "deposit": _flow_deposit,
+    "withdraw": _flow_withdraw,
+    "rewardsClaim": _flow_rewards_claim,
+    "send": _flow_send,
+    "accountClassTransfer": _flow_account_class_transfer,
+}
+
+
+def extract_flows(events: list) -> tuple[np.ndarray, np.ndarray]:
+    """Parse ledger events into (timestamps_ms, signed_amounts) arrays,
+    sorted by timestamp.
 
     Sign convention (from the perp account's perspective):
       deposit           → +
@@ -73,63 +178,143 @@ def extract_flows(events: list) -> list[tuple[int, float]]:
       spot → perp       → +
       perp → spot       → −
     """
-    flows: list[tuple[int, float]] = []
+    ts_buf: list[int] = []
+    amt_buf: list[float] = []
+    append_ts = ts_buf.append
+    append_amt = amt_buf.append
+    handler_for = FLOW_HANDLERS.get
 
     for ev in events:
-        delta = ev.get("delta", {})
-        typ = delta.get("type")
         ts = ev.get("time")
         if ts is None:
             continue
+        delta = ev.get("delta", {})
+        handler = handler_for(delta.get("type"))
+        if handler is None:
+            continue
+        amt = handler(delta)
+        if amt is not None:
+            append_ts(int(ts))
+            append_amt(amt)
+
+    flow_ts = np.fromiter(ts_buf, dtype=np.int64, count=len(ts_buf))
+    flow_amt = np.fromiter(amt_buf, dtype=np.float64, count=len(amt_buf))
+    order = np.argsort(flow_ts, kind="stable")
+    return flow_ts[order], flow_amt[order]
+
+
+def normalize_days(flow_ts: np.ndarray, flow_amt: np.ndarray, fields: list[tuple]) -> int:
+    """Write hyperliquid_normalized / diff_normalized for every day of one
+    address, given its sorted flows and the per-day tuples from main's first
+    pass.  Returns the number of days that became a match."""
+    rows = []  # (day, hl, diff, hl_ts) for days with both timestamps + HL value
+    hl_ts_l: list[int] = []
+    art_ts_l: list[int] = []
+    hl_vals: list[float] = []
+    art_vals: list[float] = []  # NaN where Artemis has no value
+    for day, hl, diff, hl_ts, art_ts, hl_val, art_val in fields:
+        if hl_ts is not None and art_ts is not None and hl_val is not None:
+            rows.append((day, hl, diff, hl_ts))
+            hl_ts_l.append(hl_ts)
+            art_ts_l.append(art_ts)
+            hl_vals.append(hl_val)
+            art_vals.append(np.nan if art_val is None else art_val)
+        else:
+            day["hyperliquid_normalized"], day["diff_normalized"] = _passthrough(hl, diff)
+
+    # Window per day: (hl_ts, art_ts]  — events AFTER HL snapshot, up to
+    # Artemis.  Both edges for every day come from one searchsorted each over
+    # the sorted flow timestamps; the net flow is a difference of prefix sums.
+    cum = np.concatenate(([0.0], np.cumsum(flow_amt)))
+    lo_idx = np.searchsorted(flow_ts, np.asarray(hl_ts_l, dtype=np.int64), side="right")
+    hi_idx = np.maximum(lo_idx, np.searchsorted(flow_ts, np.asarray(art_ts_l, dtype=np.int64), side="right"))
+    net_flow = cum[hi_idx] - cum[lo_idx]
+    norm = np.asarray(hl_vals, dtype=np.float64) + net_flow
+    art = np.asarray(art_vals, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        abs_diff = np.abs(art - norm)
+        denom = np.maximum(np.abs(art), np.abs(norm))
+        pct = np.where(denom != 0, abs_diff / denom * 100, 0.0)
+    match = pct < 0.5
+
+    value_l = np.round(norm, 6).tolist()
+    flow_l = np.round(net_flow, 6).tolist()
+    abs_l = np.round(abs_diff, 6).tolist()
+    pct_l = np.round(pct, 4).tolist()
+    match_l = match.tolist()
+    has_art_l = (~np.isnan(art)).tolist()
+    events_l = (hi_idx - lo_idx).tolist()
+
+    adjusted = 0
+    for i, (day, hl, diff, hl_ts) in enumerate(rows):
+        events_in_gap = events_l[i]
+        day["hyperliquid_normalized"] = {
+            "value": value_l[i],
+            "last_timestamp": hl_ts,
+            "source_date": hl.get("source_date"),
+            "flow_adjustment": flow_l[i] if events_in_gap else 0,
+            "events_in_gap": events_in_gap,
+        }
+
+        # Recompute diff with normalized value
+        if has_art_l[i]:
+            day["diff_normalized"] = {
+                "abs": abs_l[i],
+                "pct": pct_l[i],
+                "match": match_l[i],
+            }
+            if match_l[i] and not diff.get("match"):
+                adjusted += 1
+        else:
+            day["diff_normalized"] = {
+                "abs": None,
+                "pct": None,
+                "match": None,
+            }
+
+    return adjusted
+
+
+def _passthrough(hl: dict, diff: dict) -> tuple[dict, dict]:
+    """(hyperliquid_normalized, diff_normalized) for a day with nothing to
+    adjust: the HL value and diff unchanged."""
+    return {
+        "value": hl.get("value"),
+        "last_timestamp": hl.get("last_timestamp"),
+        "source_date": hl.get("source_date"),
+        "flow_adjustment": 0,
+        "events_in_gap": 0,
+    }, diff.copy()
+
 
-        if typ == "deposit":
-            try:
-                amt = float(delta["usdc"])
-            except (KeyError, ValueError, TypeError):
-                continue
-            flows.append((int(ts), amt))
-
-        elif typ == "withdraw":
-            try:
-                amt = float(delta["usdc"])
-            except (KeyError, ValueError, TypeError):
-                continue
-            flows.append((int(ts), -amt))
-
-        elif typ == "rewardsClaim":
-            try:
-                amt = float(delta.get("amount", 0))
-            except (ValueError, TypeError):
-                continue
-            flows.append((int(ts), amt))
-
-        elif typ == "send":
-            try:
-                amt = float(delta.get("usdcValue", delta.get("amount", 0)))
-            except (ValueError, TypeError):
-                continue
-            src = delta.get("sourceDex", "")
-            dst = delta.get("destinationDex", "")
-            if src == "" and dst == "spot":
-                # perp → spot  (money leaving perp)
-                flows.append((int(ts), -amt))
-            elif src == "spot" and dst == "":
-                # spot → perp  (money entering perp)
-                flows.append((int(ts), amt))
-
-        elif typ == "accountClassTransfer":
-            try:
-                amt = float(delta.get("usdc", 0))
-            except (ValueError, TypeError):
-                continue
-            to_perp = delta.get("toPerp", False)
-            if to_perp:
-                flows.append((int(ts), amt))
-            else:
-                flows.append((int(ts), -amt))
-
-    flows.sort(key=lambda t: t[0])
-    return flows
+def _emit_passthrough(series: list[dict]) -> None:
+    """Copy each day's HL value and diff unchanged into the normalized fields."""
+    for day in series:
+        day["hyperliquid_normalized"], day["diff_normalized"] = _passthrough(day["hyperliquid"], day["diff"])
+
+
+def build_delta(data: dict, source_generated_at: str | None) -> dict:
+    """Only the fields normalization adds: address → date → normalized fields.
+
+    Merged back onto INPUT_FILE by analysis_normalized.py when the full
+    output is missing or older.  source_generated_at is INPUT_FILE's own
+    generated_at, so the merge can refuse a delta built from another run.
+    """
+    return {
+        "generated_at": data["generated_at"],
+        "source": INPUT_FILE,
+        "source_generated_at": source_generated_at,
+        "addresses": {
+            addr_block["address"]: {
+                day["date"]: {
+                    "hyperliquid_normalized": day["hyperliquid_normalized"],
+                    "diff_normalized": day["diff_normalized"],
+                }
+                for day in addr_block["series"]
+            }
+            for addr_block in data["addresses"]
+        },
+    }
 
 
 # =============================================================================
@@ -137,146 +322,100 @@ def extract_flows(events: list) -> list[tuple[int, float]]:
 # =============================================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Normalize HL values for in-gap ledger flows.")
+    parser.add_argument(
+        "--full", action="store_true",
+        help=f"also write the merged {OUTPUT_FILE}",
+    )
+    args = parser.parse_args()
+
     # 1. Load existing comparison
     print(f"Loading {INPUT_FILE} …")
-    with open(INPUT_FILE) as f:
-        data = json.load(f)
+    data = read_json(INPUT_FILE)
 
     addresses = data["addresses"]
     print(f"  {len(addresses)} addresses, {data['days']} days\n")
 
-    # 2. For each address: fetch ledger events, build flow index, normalize
-    for idx, addr_block in enumerate(addresses, 1):
-        addr = addr_block["address"]
-        series = addr_block["series"]
-
-        # Find the global min/max timestamps across both sources
-        all_ts = []
-        for day in series:
-            art_ts = day["artemis"].get("last_timestamp")
-            hl_ts = day["hyperliquid"].get("last_timestamp")
-            if art_ts:
-                all_ts.append(art_ts)
+    # 2. One pass over each series: the global min/max timestamp across both
+    #    sources, plus the per-day fields the normalization loop reads
+    windows: list[tuple[int, int] | None] = []
+    day_fields: list[list[tuple]] = []
+    for addr_block in addresses:
+        gmin, gmax = math.inf, -math.inf
+        fields = []
+        for day in addr_block["series"]:
+            hl = day["hyperliquid"]
+            art = day["artemis"]
+            hl_ts = hl.get("last_timestamp")
+            art_ts = art.get("last_timestamp")
             if hl_ts:
-                all_ts.append(hl_ts)
-
-        if not all_ts:
-            print(f"  [{idx}/{len(addresses)}] {addr[:12]}… no timestamps, skipping")
-            for day in series:
-                day["hyperliquid_normalized"] = {
-                    "value": day["hyperliquid"].get("value"),
-                    "last_timestamp": day["hyperliquid"].get("last_timestamp"),
-                    "source_date": day["hyperliquid"].get("source_date"),
-                    "flow_adjustment": 0,
-                    "events_in_gap": 0,
-                }
-                day["diff_normalized"] = day["diff"].copy()
-            continue
-
-        global_start = min(all_ts)
-        global_end = max(all_ts)
-
-        print(
-            f"  [{idx}/{len(addresses)}] {addr[:12]}… ",
-            end="", flush=True,
-        )
-
-        # Fetch all ledger events for this address
+                gmin = hl_ts if hl_ts < gmin else gmin
+                gmax = hl_ts if hl_ts > gmax else gmax
+            if art_ts:
+                gmin = art_ts if art_ts < gmin else gmin
+                gmax = art_ts if art_ts > gmax else gmax
+            fields.append((day, hl, day["diff"], hl_ts, art_ts, hl.get("value"), art.get("value")))
+        windows.append((gmin, gmax) if gmin != math.inf else None)
+        day_fields.append(fields)
+
+    # 3. Fetch ledger events HL_WORKERS addresses at a time; results are
+    #    consumed in address order to build the flow index and normalize
+    with ThreadPoolExecutor(max_workers=HL_WORKERS) as executor:
+        futures = [
+            executor.submit(get_all_ledger_events, addr_block["address"], *window)
+            if window else None
+            for addr_block, window in zip(addresses, windows)
+        ]
         try:
-            raw_events = get_all_ledger_events(addr, global_start, global_end)
-        except Exception as e:
-            print(f"API error: {e}")
-            for day in series:
-                day["hyperliquid_normalized"] = {
-                    "value": day["hyperliquid"].get("value"),
-                    "last_timestamp": day["hyperliquid"].get("last_timestamp"),
-                    "source_date": day["hyperliquid"].get("source_date"),
-                    "flow_adjustment": 0,
-                    "events_in_gap": 0,
-                }
-                day["diff_normalized"] = day["diff"].copy()
-            continue
-
-        flows = extract_flows(raw_events)
-        print(f"{len(raw_events)} events → {len(flows)} flows … ", end="", flush=True)
-
-        # 3. For each day, find flows between HL ts and Artemis ts
-        adjusted = 0
-        for day in series:
-            hl_ts = day["hyperliquid"].get("last_timestamp")
-            art_ts = day["artemis"].get("last_timestamp")
-            hl_val = day["hyperliquid"].get("value")
-
-            if hl_ts is not None and art_ts is not None and hl_val is not None:
-                # Window: (hl_ts, art_ts]  — events AFTER HL snapshot, up to Artemis
-                gap_start = hl_ts
-                gap_end = art_ts
-
-                gap_flows = [
-                    (ts, amt)
-                    for ts, amt in flows
-                    if gap_start < ts <= gap_end
-                ]
-                net_flow = sum(amt for _, amt in gap_flows)
-                normalized_val = hl_val + net_flow
-
-                day["hyperliquid_normalized"] = {
-                    "value": round(normalized_val, 6),
-                    "last_timestamp": hl_ts,
-                    "source_date": day["hyperliquid"].get("source_date"),
-                    "flow_adjustment": round(net_flow, 6),
-                    "events_in_gap": len(gap_flows),
-                }
-
-                # Recompute diff with normalized value
-                art_val = day["artemis"].get("value")
-                if art_val is not None:
-                    abs_diff = abs(art_val - normalized_val)
-                    denom = max(abs(art_val), abs(normalized_val))
-                    pct_diff = (abs_diff / denom * 100) if denom != 0 else 0.0
-                    match = pct_diff < 0.5
-                    day["diff_normalized"] = {
-                        "abs": round(abs_diff, 6),
-                        "pct": round(pct_diff, 4),
-                        "match": match,
-                    }
-                    if match and not day["diff"].get("match"):
-                        adjusted += 1
-                else:
-                    day["diff_normalized"] = {
-                        "abs": None,
-                        "pct": None,
-                        "match": None,
-                    }
-            else:
-                day["hyperliquid_normalized"] = {
-                    "value": hl_val,
-                    "last_timestamp": day["hyperliquid"].get("last_timestamp"),
-                    "source_date": day["hyperliquid"].get("source_date"),
-                    "flow_adjustment": 0,
-                    "events_in_gap": 0,
-                }
-                day["diff_normalized"] = day["diff"].copy()
-
-        print(f"fixed {adjusted} days")
+            for idx, (addr_block, future, fields) in enumerate(zip(addresses, futures, day_fields), 1):
+                addr = addr_block["address"]
+                series = addr_block["series"]
+
+                if future is None:
+                    print(f"  [{idx}/{len(addresses)}] {addr[:12]}… no timestamps, skipping")
+                    _emit_passthrough(series)
+                    continue
+
+                print(
+                    f"  [{idx}/{len(addresses)}] {addr[:12]}… ",
+                    end="", flush=True,
+                )
+
+                # Wait for this address's ledger events
+                try:
+                    raw_events = future.result()
+                except Exception as e:
+                    print(f"API error: {e}")
+                    _emit_passthrough(series)
+                    continue
+
+                flow_ts, flow_amt = extract_flows(raw_events)
+                print(f"{len(raw_events)} events → {len(flow_ts)} flows … ", end="", flush=True)
+
+                # No flows: nothing to adjust on any day, keep the raw values
+                if not len(flow_ts):
+                    _emit_passthrough(series)
+                    print("fixed 0 days")
+                    continue
+
+                print(f"fixed {normalize_days(flow_ts, flow_amt, fields)} days")
+        except BaseException:
+            # Interrupted or failed: cancel the queued fetches instead of
+            # leaving the executor to run every remaining one on exit
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     # 4. Summary
-    ok_before = ok_after = mismatch_before = mismatch_after = missing = 0
+    before: Counter = Counter()
+    after: Counter = Counter()
     for addr_block in addresses:
         for day in addr_block["series"]:
             m_before = day["diff"].get("match")
-            m_after = day["diff_normalized"].get("match")
-            if m_before is None:
-                missing += 1
-            else:
-                if m_before:
-                    ok_before += 1
-                else:
-                    mismatch_before += 1
-                if m_after:
-                    ok_after += 1
-                else:
-                    mismatch_after += 1
+            before[m_before] += 1
+            if m_before is not None:
+                after[bool(day["diff_normalized"].get("match"))] += 1
+    ok_before, mismatch_before, missing = before[True], before[False], before[None]
+    ok_after, mismatch_after = after[True], after[False]
 
     print(f"\n{'='*60}")
     print("NORMALIZATION SUMMARY")
@@ -286,11 +425,14 @@ def main():
     print(f"  Improved:              {ok_after - ok_before:,} pairs fixed")
     print(f"  Missing (one side):    {missing:,}")
 
-    # 5. Write output
+    # 5. Write output: the normalized fields only, the merged file on request
+    source_generated_at = data.get("generated_at")
     data["generated_at"] = datetime.now(timezone.utc).isoformat()
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-    print(f"\n✅ Written to {OUTPUT_FILE}")
+    write_json(DELTA_FILE, build_delta(data, source_generated_at), indent=False)
+    print(f"\n✅ Written to {DELTA_FILE}")
+    if args.full:
+        write_json(OUTPUT_FILE, data)
+        print(f"✅ Written to {OUTPUT_FILE}")
 
 
 if __name__ == "__main__":